@@ -1,12 +1,27 @@
 import asyncio
+import time
 from fastapi import BackgroundTasks
-from .storage import cleanup_stale_chunks, persist_incomplete_files
+from .storage import (
+    cleanup_stale_chunks,
+    persist_incomplete_files,
+    next_expiry,
+    pop_expired,
+    wait_for_expiry
+)
+
+IDLE_WAIT = 3600  # Seconds to sleep when no upload is pending
 
 async def periodic_cleanup():
     while True:
-        await asyncio.sleep(3600)  # Run every hour
-        await cleanup_stale_chunks()
-        await persist_incomplete_files()
+        # Wake when the earliest upload is due to go stale
+        deadline = next_expiry()
+        delay = IDLE_WAIT if deadline is None else max(0.0, deadline - time.time())
+        await wait_for_expiry(delay)
+        
+        expired = pop_expired(time.time())
+        if expired:
+            await cleanup_stale_chunks(expired)
+            await persist_incomplete_files(expired)
 
 def setup_background_tasks():
     loop = asyncio.get_event_loop()
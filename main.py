@@ -1,32 +1,46 @@
 from fastapi import FastAPI, Depends, HTTPException, status, UploadFile, Header, Request
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from fastapi.responses import StreamingResponse, JSONResponse
+from fastapi.responses import FileResponse, JSONResponse, Response
+from fastapi.concurrency import run_in_threadpool
 from fastapi.background import BackgroundTasks
 from typing import Optional, Dict
 import os
+import re
 import uuid
 import time
 from datetime import datetime, timedelta
 
 from .auth import verify_token, create_access_token
-from .models import FileChunk, FileStatus, User
+from .models import ChunkRecord, FileStatus, User
 from .storage import (
+    has_chunk,
+    stage_chunk,
+    discard_chunk,
     save_chunk,
     assemble_file,
     get_file_status,
     get_file,
     cleanup_stale_chunks,
-    persist_incomplete_files
+    persist_incomplete_files,
+    load_tracker,
+    close_tracker
 )
 from .background import setup_background_tasks
+from .utils import validate_chunk_header
 
 app = FastAPI(title="File Transfer API", version="1.0.0")
 
 security = HTTPBearer()
 
-# Setup background tasks
+# Restore upload state, then setup background tasks
+app.add_event_handler("startup", load_tracker)
 app.add_event_handler("startup", setup_background_tasks)
 app.add_event_handler("shutdown", lambda: print("Shutting down..."))
+app.add_event_handler("shutdown", close_tracker)
+
+# "bytes <start>-<end>/<total or *>" and "bytes=<start>-<end>"
+_CONTENT_RANGE_RE = re.compile(r"bytes (\d+)-(\d+)/(\d+|\*)")
+_RANGE_RE = re.compile(r"bytes=(\d+)-(\d+)")
 
 # Mock user database (in a real app, use a proper database)
 USERS_DB = {
@@ -45,6 +59,13 @@ async def login_for_access_token(form_data: User):
     access_token = create_access_token(data={"sub": user.username})
     return {"access_token": access_token, "token_type": "bearer"}
 
+async def _chunk_body(stream, leftover: bytes):
+    # Re-yield the bytes that arrived with the header, then the rest of the body
+    if leftover:
+        yield leftover
+    async for piece in stream:
+        yield piece
+
 @app.post("/upload/{file_id}")
 async def upload_file_chunk(
     file_id: str,
@@ -58,40 +79,56 @@ async def upload_file_chunk(
     if not content_range:
         raise HTTPException(status_code=400, detail="Content-Range header required")
     
-    try:
-        unit, range_spec = content_range.split()
-        if unit != "bytes":
-            raise ValueError
-        byte_range, total_size = range_spec.split("/")
-        start_byte, end_byte = map(int, byte_range.split("-"))
-    except ValueError:
+    match = _CONTENT_RANGE_RE.fullmatch(content_range)
+    if not match:
         raise HTTPException(status_code=400, detail="Invalid Content-Range header")
-    
-    # Read chunk data with custom header
-    raw_data = await request.body()
-    if len(raw_data) < 12:  # Minimum header size
+    start_byte, end_byte = int(match[1]), int(match[2])
+    total_size = None if match[3] == "*" else int(match[3])
+    
+    # Retransmissions of bytes already stored are acknowledged without rewriting
+    if has_chunk(file_id, start_byte, end_byte):
+        return {"message": "Chunk already received", "next_byte": end_byte + 1}
+    
+    # Read just enough of the body for the custom header
+    stream = request.stream()
+    head = b""
+    async for piece in stream:
+        head += piece
+        if len(head) >= 12:
+            break
+    if len(head) < 12:  # Minimum header size
         raise HTTPException(status_code=400, detail="Invalid chunk format")
     
     # Extract header (first 12 bytes)
-    header = raw_data[:12]
-    chunk_data = raw_data[12:]
+    _, _, _, expected_checksum = validate_chunk_header(head[:12])
     
-    # Verify checksum
-    checksum = sum(chunk_data) % 256
-    if checksum != header[-1]:
+    # Stream the chunk data to disk
+    try:
+        offset, checksum = await stage_chunk(
+            file_id, start_byte, end_byte, total_size, _chunk_body(stream, head[12:])
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    # Verify checksum (CRC-32 stored in header bytes 8-12)
+    if checksum != expected_checksum:
+        discard_chunk(file_id, offset, end_byte - start_byte + 1)
         raise HTTPException(status_code=400, detail="Checksum verification failed")
     
     # Save chunk
-    chunk = FileChunk(
+    chunk = ChunkRecord(
         file_id=file_id,
         start_byte=start_byte,
         end_byte=end_byte,
-        data=chunk_data,
+        offset=offset,
         checksum=checksum,
-        total_size=int(total_size) if total_size != "*" else None
+        total_size=total_size
     )
     
-    await save_chunk(chunk)
+    try:
+        await save_chunk(chunk)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     
     return {"message": "Chunk received successfully", "next_byte": end_byte + 1}
 
@@ -104,6 +141,52 @@ async def get_file_transfer_status(
     status_info = await get_file_status(file_id)
     return status_info
 
+# Sends a byte range of a file. Servers advertising the ASGI zero-copy send
+# extension get the open file and transmit it with sendfile(2); otherwise the
+# range is read in large blocks off the event loop.
+class FileRangeResponse(Response):
+    chunk_size = 256 * 1024
+    
+    def __init__(self, path: str, start_byte: int, end_byte: int, headers: Optional[Dict[str, str]] = None):
+        self.path = path
+        self.offset = start_byte
+        self.count = end_byte - start_byte + 1
+        self.status_code = 206
+        self.media_type = "application/octet-stream"
+        self.background = None
+        self.init_headers(headers)
+    
+    async def __call__(self, scope, receive, send):
+        await send({
+            "type": "http.response.start",
+            "status": self.status_code,
+            "headers": self.raw_headers,
+        })
+        
+        f = await run_in_threadpool(open, self.path, "rb")
+        try:
+            if "http.response.zerocopysend" in scope.get("extensions", {}):
+                await send({
+                    "type": "http.response.zerocopysend",
+                    "file": f,
+                    "offset": self.offset,
+                    "count": self.count,
+                })
+                return
+            
+            await run_in_threadpool(f.seek, self.offset)
+            remaining = self.count
+            while remaining > 0:
+                data = await run_in_threadpool(f.read, min(self.chunk_size, remaining))
+                if not data:
+                    break
+                remaining -= len(data)
+                await send({"type": "http.response.body", "body": data, "more_body": remaining > 0})
+            if remaining > 0:
+                await send({"type": "http.response.body", "body": b"", "more_body": False})
+        finally:
+            await run_in_threadpool(f.close)
+
 @app.get("/download/{file_id}")
 async def download_file(
     file_id: str,
@@ -114,15 +197,17 @@ async def download_file(
     
     range_header = request.headers.get("Range")
     if not range_header:
-        return await get_file(file_id)
+        file_path = await get_file(file_id)
+        return FileResponse(
+            file_path,
+            media_type="application/octet-stream",
+            headers={"Accept-Ranges": "bytes"},
+        )
     
-    try:
-        unit, byte_range = range_header.split("=")
-        if unit != "bytes":
-            raise ValueError
-        start_byte, end_byte = map(int, byte_range.split("-"))
-    except ValueError:
+    match = _RANGE_RE.fullmatch(range_header)
+    if not match:
         raise HTTPException(status_code=400, detail="Invalid Range header")
+    start_byte, end_byte = int(match[1]), int(match[2])
     
     file_path, file_size = await get_file(file_id, return_metadata=True)
     
@@ -131,18 +216,6 @@ async def download_file(
     
     chunk_size = end_byte - start_byte + 1
     
-    def file_iterator():
-        with open(file_path, "rb") as f:
-            f.seek(start_byte)
-            remaining = chunk_size
-            while remaining > 0:
-                bytes_to_read = min(4096, remaining)
-                data = f.read(bytes_to_read)
-                if not data:
-                    break
-                yield data
-                remaining -= len(data)
-    
     headers = {
         "Content-Range": f"bytes {start_byte}-{end_byte}/{file_size}",
         "Accept-Ranges": "bytes",
@@ -150,11 +223,7 @@ async def download_file(
         "Content-Type": "application/octet-stream",
     }
     
-    return StreamingResponse(
-        file_iterator(),
-        headers=headers,
-        status_code=206,
-    )
+    return FileRangeResponse(file_path, start_byte, end_byte, headers=headers)
 
 @app.post("/cleanup")
 async def trigger_cleanup(
@@ -1,3 +1,4 @@
+from dataclasses import dataclass
 from pydantic import BaseModel
 from typing import Optional
 
@@ -5,11 +6,14 @@ class User(BaseModel):
     username: str
     password: str
 
-class FileChunk(BaseModel):
+# Internal transport for a received chunk; skips pydantic validation on the
+# upload hot path
+@dataclass(slots=True)
+class ChunkRecord:
     file_id: str
     start_byte: int
     end_byte: int
-    data: bytes
+    offset: int  # Position of the chunk data in the upload's pack file
     checksum: int
     total_size: Optional[int] = None
     timestamp: float = 0.0  # Will be set when saved
@@ -0,0 +1,46 @@
+import logging
+import socket
+import uvicorn
+
+from .main import app
+
+logger = logging.getLogger(__name__)
+
+# Configuration
+HOST = "0.0.0.0"
+PORT = 8000
+BACKLOG = 2048  # Pending connections queued by the kernel
+SOCKET_BUFFER_SIZE = 4 << 20  # SO_SNDBUF/SO_RCVBUF for MB-sized chunk transfers
+
+def _buffer_size_allowed(option: int) -> bool:
+    # The kernel silently caps the size (net.core.rmem_max/wmem_max on Linux,
+    # about 208 KiB by default). A capped fixed size is worse than the
+    # autotuned default it disables, so probe on a throwaway socket first.
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as probe:
+        probe.setsockopt(socket.SOL_SOCKET, option, SOCKET_BUFFER_SIZE)
+        return probe.getsockopt(socket.SOL_SOCKET, option) >= SOCKET_BUFFER_SIZE
+
+def create_socket(host: str = HOST, port: int = PORT) -> socket.socket:
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    # Set before listen() so accepted connections inherit the sizes and the
+    # larger receive window is negotiated during the handshake
+    for option, name in ((socket.SO_SNDBUF, "SO_SNDBUF"), (socket.SO_RCVBUF, "SO_RCVBUF")):
+        if _buffer_size_allowed(option):
+            sock.setsockopt(socket.SOL_SOCKET, option, SOCKET_BUFFER_SIZE)
+        else:
+            logger.warning(
+                "Kernel caps %s below %d bytes; leaving it to autotuning "
+                "(raise net.core.wmem_max/rmem_max to use the fixed size)",
+                name, SOCKET_BUFFER_SIZE
+            )
+    sock.bind((host, port))
+    return sock
+
+def run(host: str = HOST, port: int = PORT):
+    config = uvicorn.Config(app, backlog=BACKLOG)
+    server = uvicorn.Server(config)
+    server.run(sockets=[create_socket(host, port)])
+
+if __name__ == "__main__":
+    run()
@@ -1,86 +1,627 @@
 import os
 import json
-from typing import Dict, Optional, Tuple
+from typing import Dict, Iterable, List, Optional, Tuple
 import hashlib
-from datetime import datetime, timedelta
+from datetime import timedelta
 import asyncio
+import bisect
+from array import array
+import heapq
+import mmap
+import struct
+import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
+from .utils import calculate_checksum
+
 # Configuration
 UPLOAD_DIR = "uploads"
 CHUNK_DIR = "chunks"
 STALE_THRESHOLD = timedelta(hours=1)  # Time after which chunks are considered stale
+COPY_BUFFER_SIZE = 1 << 20  # Read size for the "copy" assembly backend
+IO_WORKERS = 32  # Threads available for blocking file-system calls
+# How chunks are copied out of a pack file: "sendfile" (in-kernel copy per
+# chunk), "writev" (mmap the pack and emit runs of chunks with one syscall) or
+# "copy"
+if hasattr(os, "sendfile"):
+    ASSEMBLY_BACKEND = "sendfile"
+elif hasattr(os, "writev"):
+    ASSEMBLY_BACKEND = "writev"
+else:
+    ASSEMBLY_BACKEND = "copy"
+IOV_MAX = 1024  # Buffers per writev call (POSIX minimum on Linux)
+WRITE_BUFFER_SIZE = 1 << 20  # Upload data is coalesced into writes of this size
+WRITE_BUFFER_POOL_SIZE = 64
 
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 os.makedirs(CHUNK_DIR, exist_ok=True)
 
+WAL_PATH = os.path.join(CHUNK_DIR, "tracker.wal")
+
 # In-memory storage for tracking uploads (in a production system, use a database)
 upload_tracker: Dict[str, Dict] = {}
 
-async def save_chunk(chunk: 'FileChunk'):
-    chunk.timestamp = datetime.now().timestamp()
+# Min-heap of (expiry deadline, file_id) driving the cleanup task; entries are
+# re-checked against last_updated when popped
+_expiry_heap: List[Tuple[float, str]] = []
+_wake_event = asyncio.Event()
+
+# Serialises cleanup_stale_chunks and persist_incomplete_files so the /cleanup
+# endpoint and the periodic task never work on the same pack files at once
+_cleanup_lock = asyncio.Lock()
+
+def _schedule_expiry(file_id: str, deadline: float):
+    heapq.heappush(_expiry_heap, (deadline, file_id))
+    _wake_event.set()
+
+def next_expiry() -> Optional[float]:
+    return _expiry_heap[0][0] if _expiry_heap else None
+
+async def wait_for_expiry(timeout: float):
+    # Sleep until the timeout or until a new deadline is scheduled
+    try:
+        await asyncio.wait_for(_wake_event.wait(), timeout)
+    except asyncio.TimeoutError:
+        pass
+    _wake_event.clear()
+
+def pop_expired(now: float) -> List[str]:
+    # Returned uploads lose their heap entry; the cleanup passes schedule the
+    # ones they keep again
+    expired = []
+    seen = set()
+    while _expiry_heap and _expiry_heap[0][0] <= now:
+        _, file_id = heapq.heappop(_expiry_heap)
+        file_info = upload_tracker.get(file_id)
+        if file_info is None or file_info.get("status") in ("complete", "dropping"):
+            continue
+        # Both passes may have rescheduled the same upload
+        if file_id in seen:
+            continue
+        seen.add(file_id)
+        
+        # Uploads that received chunks since being scheduled get a new deadline;
+        # so do uploads being assembled, in case assembly fails
+        deadline = file_info["last_updated"] + STALE_THRESHOLD.total_seconds()
+        if file_info.get("status") == "assembling":
+            deadline = max(deadline, now + STALE_THRESHOLD.total_seconds())
+        if deadline > now:
+            heapq.heappush(_expiry_heap, (deadline, file_id))
+        else:
+            expired.append(file_id)
+    return expired
+
+# Reusable write buffers for staging uploads; created on demand
+_buf_pool: List[bytearray] = []
+
+def _acquire_buffer() -> bytearray:
+    return _buf_pool.pop() if _buf_pool else bytearray(WRITE_BUFFER_SIZE)
+
+def _release_buffer(buf: bytearray):
+    if len(_buf_pool) < WRITE_BUFFER_POOL_SIZE:
+        _buf_pool.append(buf)
+
+def _tracked_items(file_ids: Optional[Iterable[str]]) -> list:
+    if file_ids is None:
+        return list(upload_tracker.items())
+    return [(file_id, upload_tracker[file_id]) for file_id in file_ids if file_id in upload_tracker]
+
+# Blocking file-system work runs here so it never stalls the event loop
+_IO_POOL = ThreadPoolExecutor(max_workers=IO_WORKERS, thread_name_prefix="storage-io")
+
+async def _run_io(func, *args):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_IO_POOL, func, *args)
+
+async def _run_io_shielded(func, *args):
+    # For calls using a buffer or fd that the caller frees once this returns:
+    # the thread cannot be interrupted, so a cancelled caller waits for it to
+    # finish before unwinding
+    loop = asyncio.get_running_loop()
+    future = loop.run_in_executor(_IO_POOL, func, *args)
+    try:
+        return await asyncio.shield(future)
+    except asyncio.CancelledError:
+        while not future.done():
+            try:
+                await asyncio.wait([future])
+            except asyncio.CancelledError:
+                pass
+        raise
+
+def _pack_path(file_id: str) -> str:
+    return os.path.join(CHUNK_DIR, f"{file_id}.pack")
+
+def _new_file_info(total_size: Optional[int], timestamp: float) -> Dict:
+    # Chunks are stored as parallel arrays sorted by start byte, so aggregates
+    # run over C arrays instead of a list of per-chunk dicts. Chunk data lives
+    # in the upload's pack file at the matching entry of "offsets".
+    return {
+        "starts": array("q"),
+        "ends": array("q"),
+        "offsets": array("q"),
+        "checksums": array("I"),
+        "timestamps": array("d"),
+        # Byte ranges received so far, merged, disjoint and sorted
+        "covered_starts": array("q"),
+        "covered_ends": array("q"),
+        "received_bytes": 0,
+        "next_byte": 0,
+        "pack_size": 0,  # Bytes reserved in the pack file
+        "writers": 0,  # Chunks currently being written to the pack
+        "total_size": total_size,
+        "last_updated": timestamp
+    }
+
+def _track_upload(file_id: str, total_size: Optional[int], timestamp: float) -> Dict:
+    file_info = upload_tracker[file_id] = _new_file_info(total_size, timestamp)
+    _schedule_expiry(file_id, timestamp + STALE_THRESHOLD.total_seconds())
+    return file_info
+
+def _is_covered(file_info: Dict, start: int, end: int) -> bool:
+    index = bisect.bisect_right(file_info["covered_starts"], start) - 1
+    return index >= 0 and file_info["covered_ends"][index] >= end
+
+def _cover(file_info: Dict, start: int, end: int) -> int:
+    # Merge [start, end] into the covered ranges; returns how many bytes were new
+    covered_starts = file_info["covered_starts"]
+    covered_ends = file_info["covered_ends"]
+    # Ranges lo..hi-1 overlap or touch [start, end]
+    lo = bisect.bisect_left(covered_ends, start - 1)
+    hi = bisect.bisect_right(covered_starts, end + 1)
+    
+    new_bytes = end - start + 1
+    merged_start, merged_end = start, end
+    for i in range(lo, hi):
+        new_bytes -= max(0, min(covered_ends[i], end) - max(covered_starts[i], start) + 1)
+        merged_start = min(merged_start, covered_starts[i])
+        merged_end = max(merged_end, covered_ends[i])
+    
+    del covered_starts[lo:hi]
+    del covered_ends[lo:hi]
+    covered_starts.insert(lo, merged_start)
+    covered_ends.insert(lo, merged_end)
+    return new_bytes
+
+def _index_chunk(file_info: Dict, start: int, end: int, offset: int, checksum: int, timestamp: float):
+    # Insert in start order; byte counts come from the covered ranges so
+    # overlapping chunks are not counted twice
+    index = bisect.bisect_right(file_info["starts"], start)
+    file_info["starts"].insert(index, start)
+    file_info["ends"].insert(index, end)
+    file_info["offsets"].insert(index, offset)
+    file_info["checksums"].insert(index, checksum)
+    file_info["timestamps"].insert(index, timestamp)
+    file_info["received_bytes"] += _cover(file_info, start, end)
+    file_info["pack_size"] = max(file_info["pack_size"], offset + end - start + 1)
     
-    # Save chunk to disk
-    chunk_filename = f"{chunk.file_id}_{chunk.start_byte}_{chunk.end_byte}.chunk"
-    chunk_path = os.path.join(CHUNK_DIR, chunk_filename)
+    if file_info["covered_starts"][0] == 0:
+        file_info["next_byte"] = file_info["covered_ends"][0] + 1
+
+def has_chunk(file_id: str, start_byte: int, end_byte: int) -> bool:
+    file_info = upload_tracker.get(file_id)
+    return (
+        file_info is not None
+        and file_info.get("status") != "dropping"
+        and _is_covered(file_info, start_byte, end_byte)
+    )
+
+# Write-ahead log of tracker changes so uploads can resume after a restart.
+# Each record is a fixed header (kind, file_id length, start, end, pack
+# offset, checksum, timestamp, total size or -1) followed by the UTF-8 file_id.
+_WAL_RECORD = struct.Struct("<BHqqqIdq")
+_WAL_CHUNK = 1
+_WAL_COMPLETE = 2
+_WAL_DROP = 3
+_wal = None  # Opened by load_tracker
+# Appends run on a single thread so records reach the log in the order they
+# were made
+_WAL_POOL = ThreadPoolExecutor(max_workers=1, thread_name_prefix="storage-wal")
+
+def _pack_wal_record(kind: int, file_id: str, start: int = 0, end: int = 0, offset: int = 0,
+                     checksum: int = 0, timestamp: float = 0.0, total_size: Optional[int] = None) -> bytes:
+    file_id_bytes = file_id.encode()
+    header = _WAL_RECORD.pack(
+        kind, len(file_id_bytes), start, end, offset, checksum, timestamp,
+        -1 if total_size is None else total_size
+    )
+    return header + file_id_bytes
+
+def _read_wal(path: str) -> list:
+    with open(path, "rb") as f:
+        data = f.read()
     
-    with open(chunk_path, "wb") as f:
-        f.write(chunk.data)
+    records = []
+    position = 0
+    while position + _WAL_RECORD.size <= len(data):
+        kind, id_len, start, end, offset, checksum, timestamp, total_size = _WAL_RECORD.unpack_from(data, position)
+        position += _WAL_RECORD.size
+        if position + id_len > len(data):
+            break  # Torn record from a crash mid-write
+        file_id = data[position:position + id_len].decode()
+        position += id_len
+        records.append((
+            kind, file_id, start, end, offset, checksum, timestamp,
+            None if total_size < 0 else total_size
+        ))
+    return records
+
+def _apply_wal_record(record: tuple):
+    kind, file_id, start, end, offset, checksum, timestamp, total_size = record
+    if kind == _WAL_CHUNK:
+        if file_id not in upload_tracker:
+            upload_tracker[file_id] = _new_file_info(total_size, timestamp)
+        file_info = upload_tracker[file_id]
+        _index_chunk(file_info, start, end, offset, checksum, timestamp)
+        file_info["last_updated"] = max(file_info["last_updated"], timestamp)
+    elif kind == _WAL_COMPLETE:
+        # The assembled file in UPLOAD_DIR is the record of a finished upload
+        upload_tracker.pop(file_id, None)
+    elif kind == _WAL_DROP:
+        upload_tracker.pop(file_id, None)
+
+def _snapshot_records() -> bytes:
+    # The current tracker as the shortest log that rebuilds it; finished
+    # uploads are left out, as replay would drop them anyway
+    records = []
+    for file_id, file_info in upload_tracker.items():
+        if file_info.get("status") == "complete":
+            continue
+        for start, end, offset, checksum, timestamp in zip(
+            file_info["starts"], file_info["ends"], file_info["offsets"],
+            file_info["checksums"], file_info["timestamps"]
+        ):
+            records.append(_pack_wal_record(
+                _WAL_CHUNK, file_id, start, end, offset, checksum, timestamp, file_info["total_size"]
+            ))
+    return b"".join(records)
+
+def _write_wal(path: str, data: bytes):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+def _append_wal(wal, record: bytes):
+    # Handed to the kernel at once so the record survives a crash of this
+    # process; a DROP left in a user-space buffer would revive chunks whose
+    # pack is already gone
+    wal.write(record)
+    wal.flush()
+
+async def _log(record: bytes):
+    if _wal is not None:
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(_WAL_POOL, _append_wal, _wal, record)
+
+def _pack_sizes(file_ids: list) -> list:
+    sizes = []
+    for file_id in file_ids:
+        try:
+            sizes.append(os.path.getsize(_pack_path(file_id)))
+        except OSError:
+            sizes.append(-1)
+    return sizes
+
+async def load_tracker():
+    global _wal
+    if await _run_io(os.path.exists, WAL_PATH):
+        for record in await _run_io(_read_wal, WAL_PATH):
+            _apply_wal_record(record)
     
-    # Update upload tracker
-    if chunk.file_id not in upload_tracker:
-        upload_tracker[chunk.file_id] = {
-            "chunks": [],
-            "total_size": chunk.total_size,
-            "last_updated": chunk.timestamp
-        }
+    # Only trust uploads whose pack still holds every indexed chunk; a missing
+    # or short pack means the chunks were lost after their records were logged
+    file_ids = list(upload_tracker)
+    for file_id, size in zip(file_ids, await _run_io(_pack_sizes, file_ids)):
+        if size < upload_tracker[file_id]["pack_size"]:
+            upload_tracker.pop(file_id)
     
-    upload_tracker[chunk.file_id]["chunks"].append({
-        "start": chunk.start_byte,
-        "end": chunk.end_byte,
-        "path": chunk_path,
-        "checksum": chunk.checksum,
-        "timestamp": chunk.timestamp
-    })
-    upload_tracker[chunk.file_id]["last_updated"] = chunk.timestamp
+    # Compact the replayed log before appending to it; this also records the
+    # uploads dropped above
+    await _run_io(_write_wal, WAL_PATH, _snapshot_records())
+    _wal = await _run_io(open, WAL_PATH, "ab")
+    
+    for file_id, file_info in list(upload_tracker.items()):
+        _schedule_expiry(file_id, file_info["last_updated"] + STALE_THRESHOLD.total_seconds())
+        # Finish uploads whose assembly was interrupted
+        total_size = file_info["total_size"]
+        if total_size is not None and file_info["next_byte"] >= total_size:
+            try:
+                await assemble_file(file_id)
+            except (OSError, EOFError):
+                pass  # Left for the client to re-upload or for cleanup
+
+async def close_tracker():
+    global _wal
+    if _wal is None:
+        return
+    wal, _wal = _wal, None
+    # Queued behind any appends still pending
+    loop = asyncio.get_running_loop()
+    await loop.run_in_executor(_WAL_POOL, wal.close)
+    await _run_io(_write_wal, WAL_PATH, _snapshot_records())
+
+def _fadvise(fd: int, advice: str):
+    # Page-cache hints are best effort and not available on every platform
+    if hasattr(os, "posix_fadvise") and hasattr(os, advice):
+        try:
+            os.posix_fadvise(fd, 0, 0, getattr(os, advice))
+        except OSError:
+            pass
+
+def _sendfile_range(out_fd: int, in_fd: int, offset: int, count: int):
+    while count > 0:
+        sent = os.sendfile(out_fd, in_fd, offset, count)
+        if sent == 0:
+            raise EOFError("Pack file is shorter than its index")
+        offset += sent
+        count -= sent
+
+def _copy_range(infile, outfile, offset: int, count: int):
+    infile.seek(offset)
+    while count > 0:
+        data = infile.read(min(COPY_BUFFER_SIZE, count))
+        if not data:
+            raise EOFError("Pack file is shorter than its index")
+        outfile.write(data)
+        count -= len(data)
+
+def _writev_all(fd: int, buffers: list):
+    # writev may write only part of the batch; resume from where it stopped
+    index = 0
+    offset = 0  # Bytes of buffers[index] already written
+    while index < len(buffers):
+        batch = buffers[index:index + IOV_MAX]
+        if offset:
+            with memoryview(batch[0]) as view, view[offset:] as rest:
+                batch[0] = rest
+                written = os.writev(fd, batch)
+        else:
+            written = os.writev(fd, batch)
+        
+        written += offset
+        while index < len(buffers) and written >= len(buffers[index]):
+            written -= len(buffers[index])
+            index += 1
+        offset = written
+
+def _writev_ranges(pack_fd: int, out_fd: int, ranges: list):
+    # Map the pack once and emit each run of adjacent chunks with writev;
+    # slices of the map would silently stop at the end of a short pack
+    if os.fstat(pack_fd).st_size < max(offset + end - start + 1 for start, end, offset in ranges):
+        raise EOFError("Pack file is shorter than its index")
+    with mmap.mmap(pack_fd, 0, access=mmap.ACCESS_READ) as pack_map, memoryview(pack_map) as view:
+        slices = []
+        try:
+            run_start = None
+            run_end = None
+            for start, end, offset in ranges:
+                if slices and start != run_end + 1:
+                    os.lseek(out_fd, run_start, os.SEEK_SET)
+                    _writev_all(out_fd, slices)
+                    for piece in slices:
+                        piece.release()
+                    slices = []
+                if not slices:
+                    run_start = start
+                slices.append(view[offset:offset + end - start + 1])
+                run_end = end
+            if slices:
+                os.lseek(out_fd, run_start, os.SEEK_SET)
+                _writev_all(out_fd, slices)
+        finally:
+            for piece in slices:
+                piece.release()
+
+def _assemble_pack(pack_path: str, output_path: str, ranges: list):
+    # Write every (start, end, offset) range from the pack at its start byte in
+    # the output, so duplicate or overlapping chunks are harmless. Unbuffered
+    # so the different backends can position the same fd directly.
+    with open(pack_path, "rb") as infile, open(output_path, "wb", buffering=0) as outfile:
+        _fadvise(infile.fileno(), "POSIX_FADV_SEQUENTIAL")
+        if not ranges:
+            return
+        if ASSEMBLY_BACKEND == "writev":
+            _writev_ranges(infile.fileno(), outfile.fileno(), ranges)
+            return
+        for start, end, offset in ranges:
+            outfile.seek(start)
+            if ASSEMBLY_BACKEND == "sendfile":
+                _sendfile_range(outfile.fileno(), infile.fileno(), offset, end - start + 1)
+            else:
+                _copy_range(infile, outfile, offset, end - start + 1)
+
+def _move_pack(pack_path: str, output_path: str, size: int):
+    # Drop anything past the end left by an interrupted write, then move the
+    # pack into place without copying. truncate would zero-fill a short pack.
+    if os.path.getsize(pack_path) < size:
+        raise EOFError("Pack file is shorter than its index")
+    os.truncate(pack_path, size)
+    os.replace(pack_path, output_path)
+
+def _remove_file(path: str):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+def _open_pack(path: str) -> int:
+    return os.open(path, os.O_WRONLY | os.O_CREAT, 0o644)
+
+def _close_pack(fd: int):
+    # Chunk data is read back once, at assembly; don't let it evict hot pages
+    # such as files being downloaded
+    _fadvise(fd, "POSIX_FADV_DONTNEED")
+    os.close(fd)
+
+def _write_at(fd: int, data, offset: int, checksum: int) -> int:
+    # Runs on an I/O thread; zlib releases the GIL while computing the CRC, so
+    # checksumming overlaps with the event loop and other uploads
+    with memoryview(data) as view:
+        checksum = calculate_checksum(view, checksum)
+        written = 0
+        while written < len(view):
+            with view[written:] as rest:
+                written += os.pwrite(fd, rest, offset + written)
+    return checksum
+
+def _write_buffer(fd: int, buf: bytearray, length: int, offset: int, checksum: int) -> int:
+    with memoryview(buf) as view, view[:length] as data:
+        return _write_at(fd, data, offset, checksum)
+
+def _release_reservation(file_info: Dict, offset: int, length: int):
+    # Only the newest reservation can be handed back; older ones stay as
+    # unindexed gaps in the pack
+    if file_info["pack_size"] == offset + length:
+        file_info["pack_size"] = offset
+
+async def stage_chunk(file_id: str, start_byte: int, end_byte: int, total_size: Optional[int], body) -> Tuple[int, int]:
+    # Stream the chunk body into space reserved at the end of the upload's pack
+    # file, batching the incoming pieces into large writes. Returns the offset
+    # of the data in the pack and its CRC-32.
+    length = end_byte - start_byte + 1
+    if length <= 0:
+        raise ValueError("Invalid byte range")
+    if total_size is not None and end_byte >= total_size:
+        raise ValueError("Byte range extends past the end of the file")
+    
+    file_info = upload_tracker.get(file_id)
+    if file_info is None:
+        file_info = _track_upload(file_id, total_size, time.time())
+    elif file_info.get("status") in ("assembling", "complete"):
+        raise ValueError("Upload already complete")
+    elif file_info.get("status") == "dropping":
+        raise ValueError("Upload expired; retry to start it again")
+    elif file_info["total_size"] is not None and end_byte >= file_info["total_size"]:
+        raise ValueError("Byte range extends past the end of the file")
+    
+    offset = file_info["pack_size"]
+    file_info["pack_size"] += length
+    file_info["writers"] += 1
+    
+    checksum = 0
+    written = 0
+    buf = _acquire_buffer()
+    try:
+        fd = await _run_io(_open_pack, _pack_path(file_id))
+        try:
+            filled = 0
+            async for piece in body:
+                if written + filled + len(piece) > length:
+                    raise ValueError("Chunk is larger than its Content-Range")
+                if filled + len(piece) > len(buf):
+                    checksum = await _run_io_shielded(_write_buffer, fd, buf, filled, offset + written, checksum)
+                    written += filled
+                    filled = 0
+                if len(piece) >= len(buf):
+                    checksum = await _run_io_shielded(_write_at, fd, piece, offset + written, checksum)
+                    written += len(piece)
+                else:
+                    buf[filled:filled + len(piece)] = piece
+                    filled += len(piece)
+            if filled:
+                checksum = await _run_io_shielded(_write_buffer, fd, buf, filled, offset + written, checksum)
+                written += filled
+            if written != length:
+                raise ValueError("Chunk is smaller than its Content-Range")
+        finally:
+            await _run_io(_close_pack, fd)
+    except BaseException:
+        _release_reservation(file_info, offset, length)
+        raise
+    finally:
+        _release_buffer(buf)
+        file_info["writers"] -= 1
+    
+    return offset, checksum
+
+def discard_chunk(file_id: str, offset: int, length: int):
+    file_info = upload_tracker.get(file_id)
+    if file_info is not None:
+        _release_reservation(file_info, offset, length)
+
+async def save_chunk(chunk: 'ChunkRecord'):
+    chunk.timestamp = time.time()
+    
+    # Update upload tracker (stage_chunk normally created the entry)
+    file_info = upload_tracker.get(chunk.file_id)
+    if file_info is None:
+        file_info = _track_upload(chunk.file_id, chunk.total_size, chunk.timestamp)
+    elif file_info.get("status") == "dropping":
+        # The pack holding the chunk is being removed
+        raise ValueError("Upload expired; retry to start it again")
+    elif _is_covered(file_info, chunk.start_byte, chunk.end_byte):
+        # A concurrent retransmission stored the same bytes first
+        _release_reservation(file_info, chunk.offset, chunk.end_byte - chunk.start_byte + 1)
+        return
+    
+    _index_chunk(
+        file_info, chunk.start_byte, chunk.end_byte, chunk.offset, chunk.checksum, chunk.timestamp
+    )
+    file_info["last_updated"] = chunk.timestamp
+    await _log(_pack_wal_record(
+        _WAL_CHUNK, chunk.file_id, chunk.start_byte, chunk.end_byte, chunk.offset,
+        chunk.checksum, chunk.timestamp, chunk.total_size
+    ))
     
     # Check if file is complete
     if chunk.total_size is not None:
-        total_received = sum(c["end"] - c["start"] + 1 for c in upload_tracker[chunk.file_id]["chunks"])
-        if total_received >= chunk.total_size:
+        if file_info["next_byte"] >= chunk.total_size:
             await assemble_file(chunk.file_id)
 
+def _is_in_place(file_info: Dict, size: int) -> bool:
+    # Chunks that arrived in order with no gaps or repeats already lay out
+    # bytes [0, size) inside the pack, e.g. a file sent as a single chunk
+    return (
+        file_info["next_byte"] == size
+        and file_info["pack_size"] == size
+        and file_info["writers"] == 0
+        and file_info["offsets"] == file_info["starts"]
+    )
+
+def _chunk_ranges(file_info: Dict) -> list:
+    return list(zip(file_info["starts"], file_info["ends"], file_info["offsets"]))
+
 async def assemble_file(file_id: str):
     if file_id not in upload_tracker:
         raise ValueError(f"File {file_id} not found in tracker")
     
     file_info = upload_tracker[file_id]
-    chunks = sorted(file_info["chunks"], key=lambda x: x["start"])
     
-    # Verify we have all chunks
+    # Verify we have all chunks: every byte before total_size is present
+    # exactly when the contiguous prefix reaches it
     expected_size = file_info["total_size"]
-    total_received = sum(c["end"] - c["start"] + 1 for c in chunks)
     
-    if expected_size is None or total_received < expected_size:
+    if expected_size is None or file_info["next_byte"] < expected_size:
         return False  # Not complete
     
+    # Another request may already be assembling this file
+    if file_info.get("status") in ("assembling", "complete"):
+        return False
+    file_info["status"] = "assembling"
+    
     # Create the complete file
     output_path = os.path.join(UPLOAD_DIR, file_id)
+    pack_path = _pack_path(file_id)
     
-    with open(output_path, "wb") as outfile:
-        for chunk in chunks:
-            with open(chunk["path"], "rb") as infile:
-                outfile.write(infile.read())
-    
-    # Clean up chunks
-    for chunk in chunks:
-        try:
-            os.remove(chunk["path"])
-        except OSError:
-            pass
+    try:
+        if _is_in_place(file_info, expected_size):
+            await _run_io(_move_pack, pack_path, output_path, expected_size)
+        else:
+            await _run_io(_assemble_pack, pack_path, output_path, _chunk_ranges(file_info))
+            
+            # Clean up chunks
+            await _run_io(_remove_file, pack_path)
+    except BaseException:
+        file_info.pop("status", None)
+        raise
     
     # Update tracker
     upload_tracker[file_id]["status"] = "complete"
+    await _log(_pack_wal_record(_WAL_COMPLETE, file_id))
     
     return True
 
@@ -96,92 +637,128 @@ async def get_file_status(file_id: str) -> dict:
         }
     
     file_info = upload_tracker[file_id]
-    chunks = file_info.get("chunks", [])
+    starts = file_info["starts"]
     
     if file_info.get("status") == "complete":
         status = "complete"
-    elif chunks:
+    elif starts:
         status = "partial"
     else:
         status = "pending"
     
-    received_bytes = sum(c["end"] - c["start"] + 1 for c in chunks)
-    
     return {
         "file_id": file_id,
         "status": status,
-        "received_bytes": received_bytes,
+        "received_bytes": file_info["received_bytes"],
         "total_bytes": file_info.get("total_size"),
         "last_updated": file_info.get("last_updated"),
-        "next_byte": max(c["end"] for c in chunks) + 1 if chunks else 0,
-        "chunks": [{"start": c["start"], "end": c["end"]} for c in chunks]
+        "next_byte": file_info["next_byte"],
+        "chunks": [{"start": start, "end": end} for start, end in zip(starts, file_info["ends"])]
     }
 
 async def get_file(file_id: str, return_metadata: bool = False):
     file_path = os.path.join(UPLOAD_DIR, file_id)
     
-    if not os.path.exists(file_path):
+    if not await _run_io(os.path.exists, file_path):
         raise FileNotFoundError(f"File {file_id} not found")
     
     if return_metadata:
-        file_size = os.path.getsize(file_path)
+        file_size = await _run_io(os.path.getsize, file_path)
         return file_path, file_size
     return file_path
 
-async def cleanup_stale_chunks():
-    now = datetime.now().timestamp()
-    threshold = (datetime.now() - STALE_THRESHOLD).timestamp()
+def _keep_scheduled(file_id: str, file_info: Dict):
+    # A pass that keeps an upload pop_expired handed it must schedule it again
+    deadline = max(file_info["timestamps"], default=file_info["last_updated"]) + STALE_THRESHOLD.total_seconds()
+    _schedule_expiry(file_id, deadline)
+
+def _abort_drop(file_id: str, file_info: Dict):
+    # Reopen the upload and try again once it goes stale
+    file_info.pop("status", None)
+    _schedule_expiry(file_id, time.time() + STALE_THRESHOLD.total_seconds())
+
+async def cleanup_stale_chunks(file_ids: Optional[Iterable[str]] = None):
+    if not upload_tracker:
+        return
     
-    for file_id, file_info in list(upload_tracker.items()):
-        if file_info.get("status") == "complete":
-            continue
-        
-        stale = True
-        for chunk in file_info["chunks"]:
-            if chunk["timestamp"] > threshold:
-                stale = False
-                break
+    async with _cleanup_lock:
+        threshold = time.time() - STALE_THRESHOLD.total_seconds()
         
-        if stale:
-            # Remove stale chunks from disk
-            for chunk in file_info["chunks"]:
-                try:
-                    os.remove(chunk["path"])
-                except OSError:
-                    pass
+        for i, (file_id, file_info) in enumerate(_tracked_items(file_ids)):
+            # Let request handlers run while scanning a large tracker
+            if i & 15 == 0:
+                await asyncio.sleep(0)
+            if file_info.get("status") == "complete":
+                continue
+            if file_info.get("status") == "assembling" or file_info["writers"]:
+                # Check again later in case the assembly or the chunk being
+                # written fails
+                _schedule_expiry(file_id, time.time() + STALE_THRESHOLD.total_seconds())
+                continue
+            
+            stale = max(file_info["timestamps"], default=file_info["last_updated"]) <= threshold
             
-            # Remove from tracker
-            del upload_tracker[file_id]
+            if stale:
+                # Refuse new chunks while the pack is removed
+                file_info["status"] = "dropping"
+                
+                # Remove stale chunks from disk
+                try:
+                    await _run_io(_remove_file, _pack_path(file_id))
+                except BaseException:
+                    _abort_drop(file_id, file_info)
+                    raise
+                
+                # Remove from tracker
+                upload_tracker.pop(file_id, None)
+                await _log(_pack_wal_record(_WAL_DROP, file_id))
+            elif file_ids is not None:
+                _keep_scheduled(file_id, file_info)
 
-async def persist_incomplete_files():
-    now = datetime.now().timestamp()
-    threshold = (datetime.now() - STALE_THRESHOLD).timestamp()
+async def persist_incomplete_files(file_ids: Optional[Iterable[str]] = None):
+    if not upload_tracker:
+        return
     
-    for file_id, file_info in list(upload_tracker.items()):
-        if file_info.get("status") == "complete":
-            continue
+    async with _cleanup_lock:
+        threshold = time.time() - STALE_THRESHOLD.total_seconds()
         
-        # Check if any chunks are recent
-        recent_activity = any(
-            chunk["timestamp"] > threshold 
-            for chunk in file_info["chunks"]
-        )
-        
-        if not recent_activity and file_info["chunks"]:
-            # Persist incomplete file
-            output_path = os.path.join(UPLOAD_DIR, f"{file_id}.incomplete")
+        for i, (file_id, file_info) in enumerate(_tracked_items(file_ids)):
+            # Let request handlers run while scanning a large tracker
+            if i & 15 == 0:
+                await asyncio.sleep(0)
+            if file_info.get("status") == "complete":
+                continue
+            if file_info.get("status") == "assembling" or file_info["writers"]:
+                # Check again later in case the assembly or the chunk being
+                # written fails
+                _schedule_expiry(file_id, time.time() + STALE_THRESHOLD.total_seconds())
+                continue
             
-            with open(output_path, "wb") as outfile:
-                for chunk in sorted(file_info["chunks"], key=lambda x: x["start"]):
-                    with open(chunk["path"], "rb") as infile:
-                        outfile.write(infile.read())
+            # Check if any chunks are recent
+            recent_activity = max(file_info["timestamps"], default=file_info["last_updated"]) > threshold
             
-            # Clean up chunks
-            for chunk in file_info["chunks"]:
+            if not recent_activity and file_info["starts"]:
+                # Persist incomplete file, keeping each chunk at its byte offset
+                output_path = os.path.join(UPLOAD_DIR, f"{file_id}.incomplete")
+                pack_path = _pack_path(file_id)
+                
+                # Refuse new chunks while the pack is moved out
+                file_info["status"] = "dropping"
+                
                 try:
-                    os.remove(chunk["path"])
-                except OSError:
-                    pass
-            
-            # Remove from tracker
-            del upload_tracker[file_id]
\ No newline at end of file
+                    if _is_in_place(file_info, file_info["next_byte"]):
+                        await _run_io(_move_pack, pack_path, output_path, file_info["next_byte"])
+                    else:
+                        await _run_io(_assemble_pack, pack_path, output_path, _chunk_ranges(file_info))
+                        
+                        # Clean up chunks
+                        await _run_io(_remove_file, pack_path)
+                except BaseException:
+                    _abort_drop(file_id, file_info)
+                    raise
+                
+                # Remove from tracker
+                upload_tracker.pop(file_id, None)
+                await _log(_pack_wal_record(_WAL_DROP, file_id))
+            elif file_ids is not None:
+                _keep_scheduled(file_id, file_info)
\ No newline at end of file
@@ -1,16 +1,27 @@
 import os
 import hashlib
+import struct
 
-def calculate_checksum(data: bytes) -> int:
-    return sum(data) % 256
+try:
+    from zlib import crc32
+except ImportError:  # Python built without zlib
+    # binascii carries its own table-driven CRC-32 in C (same polynomial),
+    # so checksums stay compatible without a per-byte Python loop
+    from binascii import crc32
+
+# Chunk header: big-endian start byte, end byte and CRC-32 of the chunk data
+CHUNK_HEADER = struct.Struct(">III")
+
+def calculate_checksum(data: bytes, value: int = 0) -> int:
+    # Table-driven CRC-32 in C (zlib), instead of a per-byte Python loop.
+    # Pass the previous result as value to checksum data incrementally.
+    return crc32(data, value) & 0xFFFFFFFF
 
 def validate_chunk_header(header: bytes) -> tuple:
-    if len(header) < 12:
+    if len(header) < CHUNK_HEADER.size:
         return False, None, None, None
     
-    start_byte = int.from_bytes(header[:4], byteorder='big')
-    end_byte = int.from_bytes(header[4:8], byteorder='big')
-    checksum = int.from_bytes(header[8:12], byteorder='big')
+    start_byte, end_byte, checksum = CHUNK_HEADER.unpack_from(header)
     
     return True, start_byte, end_byte, checksum
 